@@ -1,7 +1,26 @@
 import streamlit as st
 from db_connector import fetch_schema
 from prompt_builder import build_prompt
-from openrouter_model import generate_sql # UPDATED: Changed import from hf_model
+from openrouter_model import generate_sql_stream, extract_sql_from_response # UPDATED: Changed import from hf_model
+
+@st.cache_data(ttl=3600)
+def render_schema_markdown(schema_tuple):
+    """
+    Renders the schema as a single markdown block. Cached per schema so reruns
+    triggered by widget interactions don't rebuild it.
+
+    Args:
+        schema_tuple: Hashable form of the schema, ((table, ((col, type), ...)), ...)
+    """
+    sections = []
+    for table, columns in schema_tuple:
+        cols_info = "\n".join(f"• **{col}**: {typ}" for col, typ in columns)
+        sections.append(f"### Table: {table}\n{cols_info}\n\n---")
+    return "\n\n".join(sections)
+
+def clear_question():
+    """Clears the question text area (bound to st.session_state.question)."""
+    st.session_state.question = ""
 
 def main():
     st.set_page_config(page_title="SQL Query Generator", page_icon="🔍", layout="wide")
@@ -28,20 +47,16 @@ def main():
 
     # Display schema in an expandable section
     with st.expander("📊 View Database Schema", expanded=False):
-        for table, columns in schema.items():
-            st.subheader(f"Table: {table}")
-            cols_info = []
-            for col, typ in columns:
-                cols_info.append(f"• **{col}**: {typ}")
-            st.markdown("\n".join(cols_info))
-            st.markdown("---")
+        schema_tuple = tuple((table, tuple(columns)) for table, columns in schema.items())
+        st.markdown(render_schema_markdown(schema_tuple))
 
     # Main input section
     st.subheader("💬 Enter Your Question")
     question = st.text_area(
         "Write your question in natural language:",
         placeholder="e.g., Show me all customers from New York",
-        height=100
+        height=100,
+        key="question"
     )
 
     col1, col2 = st.columns([1, 4])
@@ -50,10 +65,9 @@ def main():
         generate_button = st.button("🚀 Generate SQL", type="primary")
     
     with col2:
-        clear_button = st.button("🗑️ Clear")
-    
-    if clear_button:
-        st.rerun()
+        # Reset the question through session state in a callback; callbacks run
+        # before the script, so no extra st.rerun() cycle is needed
+        st.button("🗑️ Clear", on_click=clear_question)
 
     if generate_button:
         if not question.strip():
@@ -70,8 +84,17 @@ def main():
                     with st.expander("🔧 Debug: View Generated Prompt", expanded=False):
                         st.text(prompt)
                     
+                    # Render the response as it streams in, then extract the queries
+                    # from the full text once the stream ends
+                    stream_placeholder = st.empty()
+                    response_text = ""
+                    for token in generate_sql_stream(prompt):
+                        response_text += token
+                        stream_placeholder.code(response_text, language="sql")
+                    stream_placeholder.empty()
+
                     # sql_queries will now be a list of strings
-                    sql_queries = generate_sql(prompt) 
+                    sql_queries = extract_sql_from_response(response_text)
                     
                     # Check if any valid queries were returned (not empty and not an error list)
                     if sql_queries and not (len(sql_queries) == 1 and sql_queries[0].startswith("-- Error")):
@@ -99,6 +122,8 @@ def main():
                         if sql_queries and sql_queries[0].startswith("-- Error"):
                             st.code(sql_queries[0]) 
                         
+                except TimeoutError as e:
+                    st.error(f"⏱️ Query timed out: {e}. Please try again.")
                 except Exception as e:
                     st.error(f"❌ An error occurred: {e}")
 
@@ -1,40 +1,204 @@
 import os
+import hashlib
+import pickle
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
 import psycopg2
-from psycopg2 import sql
+import psycopg2.pool
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Persistent schema cache settings. The cache file name is derived from the
+# connection settings, so pointing the app at another database never reuses
+# a schema fetched from a different one.
+SCHEMA_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "nl2sql")
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "600")) # Seconds before a cached schema is refreshed
+
+_schema_refresh_lock = threading.Lock()
+
+# Connection pool settings. The pool itself is created lazily on first use so
+# importing this module never opens a connection.
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 8
+
+_POOL = None
+_pool_lock = threading.Lock()
+
+# Timeouts so a hung database never blocks the app indefinitely
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10")) # Seconds
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000")) # Per-statement limit
+
+def _connection_params():
+    """
+    Returns the psycopg2 connection keyword arguments read from environment variables.
+    statement_timeout is passed as a startup option so it applies to every
+    connection (including pooled ones) without an extra SET round trip.
+    """
+    return {
+        "host": os.getenv("DB_HOST"),
+        "port": os.getenv("DB_PORT"),
+        "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "connect_timeout": DB_CONNECT_TIMEOUT,
+        "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    }
+
 def get_db_connection():
     """
     Establishes a connection to the PostgreSQL database using environment variables.
     Raises an exception if connection fails.
     """
     try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT"),
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD")
-        )
+        conn = psycopg2.connect(**_connection_params())
         print("✅ Database connection successful.")
         return conn
     except Exception as e:
         print(f"❌ Error connecting to database: {e}")
         raise # Re-raise the exception after logging
 
+def _get_pool():
+    """
+    Returns the module-level connection pool, creating it on first use.
+    """
+    global _POOL
+    if _POOL is None:
+        with _pool_lock:
+            if _POOL is None:
+                _POOL = psycopg2.pool.ThreadedConnectionPool(
+                    POOL_MIN_CONN, POOL_MAX_CONN, **_connection_params()
+                )
+                print("✅ Database connection pool created.")
+    return _POOL
+
+@contextmanager
+def get_pooled_connection():
+    """
+    Context manager that borrows a connection from the pool and returns it on exit.
+    Any open transaction is rolled back before the connection goes back to the
+    pool; broken connections are discarded instead of being reused.
+    """
+    pool = _get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        pool.putconn(conn, close=broken)
+
+def _schema_cache_path():
+    """
+    Returns the on-disk cache file for the current DB connection settings.
+    """
+    dsn = "|".join(os.getenv(var, "") for var in ("DB_HOST", "DB_PORT", "DB_NAME", "DB_USER"))
+    dsn_hash = hashlib.sha256(dsn.encode()).hexdigest()[:16]
+    return os.path.join(SCHEMA_CACHE_DIR, f"schema_{dsn_hash}.pkl")
+
+def _load_schema_cache(path):
+    """
+    Loads a cache entry ({"schema", "fetched_at", "db_version"}) from disk.
+    Returns None if the file is missing or unreadable.
+    """
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+def _save_schema_cache(path, schema, db_version):
+    """
+    Atomically writes a cache entry to disk so concurrent readers never see a
+    partially written file.
+    """
+    entry = {"schema": schema, "fetched_at": time.time(), "db_version": db_version}
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entry, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️ Could not write schema cache: {e}")
+    return entry
+
+def _refresh_schema_cache(path):
+    """
+    Fetches the schema from the database and stores it in the on-disk cache.
+    Empty schemas (e.g. a failed fetch) are never cached.
+    """
+    schema, db_version = _fetch_schema_from_db()
+    if schema:
+        _save_schema_cache(path, schema, db_version)
+    return schema
+
+def _refresh_schema_cache_in_background(path):
+    """
+    Starts a background refresh unless one is already running.
+    """
+    if not _schema_refresh_lock.acquire(blocking=False):
+        return
+
+    def _worker():
+        try:
+            _refresh_schema_cache(path)
+        finally:
+            _schema_refresh_lock.release()
+
+    threading.Thread(target=_worker, daemon=True).start()
+
+def refresh_schema():
+    """
+    Fetches the schema from the database right away, bypassing the on-disk
+    cache, and stores the result in it. Use after DDL changes.
+
+    Returns:
+        dict: The schema in the same format as fetch_schema, or {} on error
+              (in which case the existing cache entry is left untouched).
+    """
+    return _refresh_schema_cache(_schema_cache_path())
+
 def fetch_schema():
     """
-    Connects to the database, retrieves the schema (table names and their columns
-    with data types), and returns it as a dictionary.
+    Retrieves the schema (table names and their columns with data types) and
+    returns it as a dictionary.
+
+    Results are cached on disk per connection settings. A fresh cache entry is
+    returned directly; a stale one is returned immediately while a background
+    thread refreshes it (stale-while-revalidate). The database is only queried
+    synchronously when no cache entry exists.
 
     Returns:
         dict: A dictionary where keys are table names (str) and values are
               lists of (column_name, data_type) tuples.
               Example: {'customers': [('id', 'integer'), ('name', 'text')]}
     """
+    path = _schema_cache_path()
+    cached = _load_schema_cache(path)
+    if not cached or not cached.get("schema"):
+        return _refresh_schema_cache(path)
+
+    if time.time() - cached["fetched_at"] > SCHEMA_CACHE_TTL:
+        _refresh_schema_cache_in_background(path)
+    return cached["schema"]
+
+def _fetch_schema_from_db():
+    """
+    Connects to the database and retrieves the schema directly, bypassing the cache.
+
+    Returns:
+        tuple: (schema dict, server_version int). On error, ({}, None).
+    """
     conn = None # Initialize conn to None
     cur = None  # Initialize cur to None
     schema = {}
@@ -42,31 +206,24 @@ def fetch_schema():
         conn = get_db_connection()
         cur = conn.cursor()
 
-        # Fetch all table names from the public schema
+        # Fetch every column of every table in the public schema in a single
+        # round-trip, then group the rows by table in Python.
         cur.execute("""
-            SELECT table_name
-            FROM information_schema.tables
+            SELECT table_name, column_name, data_type
+            FROM information_schema.columns
             WHERE table_schema = 'public'
-            ORDER BY table_name;
+            ORDER BY table_name, ordinal_position;
         """)
-        tables = cur.fetchall()
-
-        # For each table, fetch its column names and data types
-        for (table_name,) in tables:
-            cur.execute(sql.SQL("""
-                SELECT column_name, data_type
-                FROM information_schema.columns
-                WHERE table_name = %s
-                ORDER BY ordinal_position;
-            """), [table_name])
-            columns = cur.fetchall()
-            schema[table_name] = columns # Already in (col_name, col_type) tuple format
-        
+        rows = cur.fetchall()
+
+        for table_name, columns in groupby(rows, key=itemgetter(0)):
+            schema[table_name] = [(col_name, col_type) for _, col_name, col_type in columns]
+
         print("✅ Database schema fetched successfully.")
-        return schema
+        return schema, conn.server_version
     except Exception as e:
         print(f"❌ Error fetching schema: {e}")
-        return {} # Return empty schema on error
+        return {}, None # Return empty schema on error
     finally:
         if cur:
             cur.close()
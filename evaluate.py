@@ -1,5 +1,6 @@
 import os
 import sys
+import asyncio
 from dotenv import load_dotenv
 # Add the current directory to the Python path if running from a different location
 # This helps in importing local modules like openrouter_model, test_cases, metrics
@@ -8,84 +9,123 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 # Load environment variables for database connection and API keys
 load_dotenv()
 
-# We now import generate_sql_with_auto_confirm for automated evaluation
-from openrouter_model import generate_sql_with_auto_confirm 
-from test_cases import test_cases
-from metrics import calculate_exact_match_accuracy, calculate_execution_accuracy, execute_sql_and_fetch
+# We now import the async agenerate_sql_with_auto_confirm for concurrent automated evaluation
+from openrouter_model import agenerate_sql_with_auto_confirm
+from test_cases import nl_queries, expected_sqls
+import psycopg2
+from db_connector import get_db_connection
+from metrics import normalize_sql, calculate_exact_match_accuracy_prenorm, calculate_execution_accuracy, execute_sql_and_fetch, execute_many_and_fetch
 import pandas as pd # Import pandas for displaying dataframes
 
-def run_evaluation():
-    print("--- Starting NL2SQL Model Evaluation ---")
-
+# LLM calls are I/O-bound HTTP requests, so they are issued concurrently.
+# Keep this modest to stay within OpenRouter rate limits.
+LLM_MAX_WORKERS = int(os.getenv("NL2SQL_LLM_WORKERS", "8"))
+
+async def run_test_cases(nl_queries: list) -> list:
+    """
+    Generates SQL (with auto-schema-confirm) for all NL queries concurrently,
+    at most LLM_MAX_WORKERS at a time. Results keep the order of nl_queries.
+    """
+    semaphore = asyncio.Semaphore(LLM_MAX_WORKERS)
+
+    async def generate(nl_query):
+        async with semaphore:
+            return await agenerate_sql_with_auto_confirm(nl_query)
+
+    return await asyncio.gather(*(generate(nl_query) for nl_query in nl_queries))
+
+# Result sets are only rendered when NL2SQL_VERBOSE is set, and then only the
+# first PREVIEW_ROWS rows, so large results don't stall batch evaluation runs.
+VERBOSE = bool(os.getenv("NL2SQL_VERBOSE"))
+PREVIEW_ROWS = 20
+
+def print_result_preview(data: list, cols: list):
+    """Prints the head of a query result, or just its row count when not verbose."""
+    if not VERBOSE:
+        print(f"{len(data)} row(s) returned. Set NL2SQL_VERBOSE=1 to display them.")
+        return
+    if cols: # Only print pandas DF if columns exist
+        df = pd.DataFrame(data[:PREVIEW_ROWS], columns=cols)
+        print(df.to_string(index=False))
+    else: # If no columns but data, just print rows
+        print("No columns returned. Data:", data[:PREVIEW_ROWS])
+    if len(data) > PREVIEW_ROWS:
+        print(f"... ({len(data) - PREVIEW_ROWS} more rows)")
+
+def score_test_cases(generated_sqls: list, exact_match_scores: list, conn) -> tuple:
+    """
+    Executes the expected and generated SQL of every non-exact-match test case on
+    conn and scores execution accuracy. If conn is None (the database could not
+    be reached), those test cases score 0 without being executed.
+    Returns (execution_accuracy_scores, number of executions skipped by exact match).
+    """
     # --- IMPORTANT: Get column names AND DATA for expected results ---
-    # This loop runs the expected SQL once for each test case to fetch its data and column names.
+    # Expected SQL for the non-exact-match cases is executed in one batch to fetch its data and column names.
     # This is necessary for robust result comparison in calculate_execution_accuracy.
-    print("Pre-fetching data and column names for expected results from database...")
-    for i, test_case in enumerate(test_cases):
-        # Execute the expected SQL to get its data and column names
-        data, cols = execute_sql_and_fetch(test_case["expected_sql"].strip())
-        
-        # Store the fetched data and columns in the test_case dictionary
-        test_case["expected_result"] = data if data is not None else []
-        test_case["expected_result_cols"] = cols if cols is not None else []
+    to_execute = [i for i, em_score in enumerate(exact_match_scores) if em_score < 1.0] if conn is not None else []
+    fetched = []
+    if to_execute:
+        print("Pre-fetching data and column names for expected results from database...")
+        fetched = execute_many_and_fetch([expected_sqls[i] for i in to_execute], conn=conn)
+    expected_data = [None] * len(expected_sqls)
+    expected_cols = [None] * len(expected_sqls)
+    for i, (data, cols) in zip(to_execute, fetched):
+        expected_data[i] = data if data is not None else []
+        expected_cols[i] = cols if cols is not None else []
 
         if data is None:
             print(f"    WARNING: Expected SQL for Test Case {i+1} failed to execute or returned None. Treating expected result as empty.")
-        elif not cols and test_case["expected_result"]: # If no columns but data exists, create generic names
+        elif not cols and expected_data[i]: # If no columns but data exists, create generic names
             print(f"    WARNING: Could not fetch columns for Test Case {i+1} from expected SQL. Inferring from data if available.")
-            test_case["expected_result_cols"] = [f"col_{j}" for j in range(len(test_case["expected_result"][0]))]
+            expected_cols[i] = [f"col_{j}" for j in range(len(expected_data[i][0]))]
         
-    exact_match_scores = []
     execution_accuracy_scores = []
+    short_circuited = 0 # Test cases whose execution was skipped due to an exact match
 
     print("\n--- Running Test Cases ---")
-    for i, test_case in enumerate(test_cases):
-        nl_query = test_case["nl_query"]
-        expected_sql = test_case["expected_sql"].strip()
-        
-        expected_result_data = test_case["expected_result"]
-        expected_result_cols = test_case["expected_result_cols"]
-
+    for i, (nl_query, expected_sql, generated_sql, em_score) in enumerate(
+            zip(nl_queries, expected_sqls, generated_sqls, exact_match_scores)):
         print(f"\n--- Test Case {i+1} ---")
         print(f"NL Query: {nl_query}")
         print(f"Expected SQL:\n{expected_sql}")
-
-        # Generate SQL from model using the auto-confirm function
-        print(f"🔄 Sending NL Query to LLM for SQL generation (with auto-schema-confirm)...")
-        # generate_sql_with_auto_confirm returns a dictionary with 'success', 'sql_queries', etc.
-        generated_response = generate_sql_with_auto_confirm(nl_query) 
-        
-        # Extract the first generated SQL query, or an empty string if none
-        generated_sql = generated_response["sql_queries"][0] if generated_response["sql_queries"] else "" 
-
         print(f"Generated SQL:\n{generated_sql}")
 
+        if em_score == 1.0:
+            short_circuited += 1
+            exec_acc_score = 1.0
+            print("\nGenerated SQL exactly matches the expected SQL; skipping execution.")
+            print(f"\nExact Match Accuracy: {em_score:.2f}")
+            execution_accuracy_scores.append(exec_acc_score)
+            print(f"Execution Accuracy: {exec_acc_score:.2f}")
+            continue
+
+        if conn is None:
+            print("\nDatabase unavailable; execution accuracy scored as 0.")
+            print(f"\nExact Match Accuracy: {em_score:.2f}")
+            execution_accuracy_scores.append(0.0)
+            print("Execution Accuracy: 0.00")
+            continue
+
+        expected_result_data = expected_data[i]
+        expected_result_cols = expected_cols[i]
+
         # --- Fetch and Display Generated SQL Result ---
         print("\n--- Generated SQL Query Answer ---")
-        generated_data, generated_cols = execute_sql_and_fetch(generated_sql)
+        generated_data, generated_cols, generated_truncated = execute_sql_and_fetch(generated_sql, conn=conn)
+        if generated_truncated:
+            print(f"WARNING: Generated SQL result was truncated to {len(generated_data)} rows.")
         if generated_data is not None and generated_cols is not None:
-            if generated_cols: # Only print pandas DF if columns exist
-                generated_df = pd.DataFrame(generated_data, columns=generated_cols)
-                print(generated_df.to_string(index=False)) # Use to_string for full display
-            else: # If no columns but data, just print rows
-                print("No columns returned. Data:", generated_data)
+            print_result_preview(generated_data, generated_cols)
         else:
             print("Failed to execute generated SQL or no results.")
 
         # --- Display Correct SQL Query Answer (already pre-fetched) ---
         print("\n--- Correct SQL Query Answer ---")
         if expected_result_data is not None and expected_result_cols is not None:
-            if expected_result_cols: # Only print pandas DF if columns exist
-                expected_df = pd.DataFrame(expected_result_data, columns=expected_result_cols)
-                print(expected_df.to_string(index=False)) # Use to_string for full display
-            else: # If no columns but data, just print rows
-                print("No columns returned. Data:", expected_result_data)
+            print_result_preview(expected_result_data, expected_result_cols)
         else:
             print("Expected SQL result data not available.")
 
-        # Calculate Exact Match Accuracy
-        em_score = calculate_exact_match_accuracy(generated_sql, expected_sql)
-        exact_match_scores.append(em_score)
         print(f"\nExact Match Accuracy: {em_score:.2f}")
 
         # Calculate Execution Accuracy
@@ -96,19 +136,62 @@ def run_evaluation():
             expected_result_data,
             expected_result_cols,
             generated_data=generated_data, # Pass fetched data
-            generated_cols=generated_cols # Pass fetched columns
+            generated_cols=generated_cols, # Pass fetched columns
+            generated_truncated=generated_truncated
         )
         execution_accuracy_scores.append(exec_acc_score)
         print(f"Execution Accuracy: {exec_acc_score:.2f}")
 
+    return execution_accuracy_scores, short_circuited
+
+def run_evaluation():
+    print("--- Starting NL2SQL Model Evaluation ---")
+
+    # Generate SQL for all test cases concurrently (with auto-schema-confirm).
+    print(f"\n🔄 Sending {len(nl_queries)} NL Queries to LLM for SQL generation (with auto-schema-confirm)...")
+    generated_responses = asyncio.run(run_test_cases(nl_queries))
+
+    # generate_sql_with_auto_confirm returns a dictionary with 'success', 'sql_queries', etc.
+    # Extract the first generated SQL query, or an empty string if none
+    generated_sqls = [
+        response["sql_queries"][0] if response["sql_queries"] else ""
+        for response in generated_responses
+    ]
+
+    # Calculate Exact Match Accuracy up front: an exact match runs the same query
+    # against the same DB, so its execution accuracy is trivially 1.0 and neither
+    # the generated nor the expected SQL needs to be executed.
+    # Expected SQL is a static fixture, so it is normalized only once per test case.
+    normalized_expected_sqls = [normalize_sql(expected_sql) for expected_sql in expected_sqls]
+    exact_match_scores = [
+        calculate_exact_match_accuracy_prenorm(generated_sql, normalized_expected_sql)
+        for generated_sql, normalized_expected_sql in zip(generated_sqls, normalized_expected_sqls)
+    ]
+
+    # A single DB connection is reused for every query in this evaluation run. It is
+    # only opened if some test case needs executing, and a failed connection scores
+    # those cases 0 instead of aborting before the summary.
+    conn = None
+    if any(em_score < 1.0 for em_score in exact_match_scores):
+        try:
+            conn = get_db_connection()
+        except psycopg2.Error as e:
+            print(f"❌ Could not connect to the database, skipping execution: {e}")
+    try:
+        execution_accuracy_scores, short_circuited = score_test_cases(generated_sqls, exact_match_scores, conn)
+    finally:
+        if conn is not None:
+            conn.close()
+
     # Report Summary
-    avg_em = sum(exact_match_scores) / len(exact_match_scores) if test_cases else 0
-    avg_exec_acc = sum(execution_accuracy_scores) / len(execution_accuracy_scores) if test_cases else 0
+    avg_em = sum(exact_match_scores) / len(exact_match_scores) if nl_queries else 0
+    avg_exec_acc = sum(execution_accuracy_scores) / len(execution_accuracy_scores) if nl_queries else 0
 
     print("\n--- Evaluation Summary ---")
-    print(f"Total Test Cases: {len(test_cases)}")
+    print(f"Total Test Cases: {len(nl_queries)}")
     print(f"Average Exact Match Accuracy: {avg_em:.2%}")
     print(f"Average Execution Accuracy: {avg_exec_acc:.2%}")
+    print(f"Executions Skipped (exact match): {short_circuited}")
     print("--------------------------")
 
 if __name__ == "__main__":
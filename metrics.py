@@ -1,17 +1,52 @@
 import os
-from db_connector import get_db_connection
+import functools
+from db_connector import get_pooled_connection
 import pandas as pd
 import re
+import sqlglot
 import psycopg2
+import psycopg2.pool
 import numpy as np # Import numpy for better NaN handling and float comparisons
 
+# Server-side cursor settings for execute_sql_and_fetch
+FETCH_CHUNK_SIZE = 10000 # Rows fetched from the server per round trip
+MAX_RESULT_ROWS = 100000 # Results beyond this are truncated and never compare as equal
+
+# Patterns used by normalize_sql, compiled once at import time
+_WS_RE = re.compile(r'\s+')
+_PUNCT_RE = re.compile(r'\s*([,;=<>!+\-/()\[\]])\s*')
+_STRING_LITERAL_RE = re.compile(r"('(?:[^']|'')*')")
+
+def _regex_normalize_sql(sql_query: str) -> str:
+    """
+    Collapses whitespace around punctuation; fallback for SQL sqlglot cannot parse.
+    Everything outside string literals is lowercased; literals keep their case,
+    since 'USA' and 'usa' select different rows.
+    """
+    collapsed = _PUNCT_RE.sub(r'\1', _WS_RE.sub(' ', sql_query).strip())
+    parts = _STRING_LITERAL_RE.split(collapsed) # Odd indexes are the literals
+    return "".join(part if i % 2 else part.lower() for i, part in enumerate(parts))
+
+@functools.lru_cache(maxsize=1024)
+def _normalize_sql_cached(sql_query: str) -> str:
+    try:
+        statements = sqlglot.transpile(sql_query, read="postgres", write="postgres", pretty=False, normalize=True)
+    except sqlglot.errors.SqlglotError:
+        return _regex_normalize_sql(sql_query)
+    # No lowercasing here: normalize=True already folds unquoted identifiers and
+    # keywords come out in one case, while string literals must keep theirs
+    return "; ".join(statements)
+
 def normalize_sql(sql_query: str) -> str:
-    """Normalizes a SQL query string for exact match comparison."""
+    """
+    Normalizes a SQL query string for exact match comparison.
+    Queries are parsed and regenerated with sqlglot so formatting, comments and
+    keyword case don't matter; unparseable SQL falls back to regex normalization.
+    String literals keep their case, so an exact match implies the same results.
+    """
     if not isinstance(sql_query, str):
         return ""
-    sql_query = re.sub(r'\s+', ' ', sql_query).strip()
-    sql_query = re.sub(r'\s*([,;=<>!+-/()\\[\]])\s*', r'\1', sql_query)
-    return sql_query.lower()
+    return _normalize_sql_cached(sql_query)
 
 def calculate_exact_match_accuracy(generated_sql: str, expected_sql: str) -> float:
     """Calculates exact match accuracy."""
@@ -19,29 +54,142 @@ def calculate_exact_match_accuracy(generated_sql: str, expected_sql: str) -> flo
     normalized_expected = normalize_sql(expected_sql)
     return 1.0 if normalized_generated == normalized_expected else 0.0
 
-def execute_sql_and_fetch(sql_query: str):
-    """Executes a SQL query using your existing DB connection and returns results."""
-    conn = None
+def calculate_exact_match_accuracy_prenorm(generated_sql: str, normalized_expected_sql: str) -> float:
+    """Calculates exact match accuracy against an expected SQL already passed through normalize_sql."""
+    return 1.0 if normalize_sql(generated_sql) == normalized_expected_sql else 0.0
+
+def _fetch_with_server_cursor(conn, sql_query: str):
+    """
+    Runs sql_query through a server-side (named) cursor on conn and returns
+    (rows, column_names, truncated), reading at most MAX_RESULT_ROWS rows.
+    """
+    with conn.cursor(name="nl2sql_cur") as cursor:
+        cursor.execute(sql_query)
+        rows = []
+        truncated = False
+        while True:
+            chunk = cursor.fetchmany(FETCH_CHUNK_SIZE)
+            if not chunk:
+                break
+            rows.extend(chunk)
+            if len(rows) > MAX_RESULT_ROWS:
+                del rows[MAX_RESULT_ROWS:]
+                truncated = True
+                break
+        column_names = [desc[0] for desc in cursor.description]
+        return rows, column_names, truncated
+
+def execute_sql_and_fetch(sql_query: str, conn=None):
+    """
+    Executes a SQL query and returns (data, column_names, truncated).
+
+    A server-side (named) cursor streams the result in chunks so a runaway
+    generated query such as SELECT * FROM big_table cannot exhaust client memory.
+    At most MAX_RESULT_ROWS rows are returned; truncated is True when the
+    result had more rows than that.
+
+    Pass an open connection as conn to run several queries on it (e.g. across a
+    whole evaluation); otherwise a connection is borrowed from the pool. The
+    caller keeps ownership of conn: its transaction is rolled back after the
+    query, but it is never closed here.
+    """
     try:
-        conn = get_db_connection()
-        if not conn:
-            print("    Failed to get database connection.")
-            return None, None
-        with conn.cursor() as cursor:
-            cursor.execute(sql_query)
-            rows = cursor.fetchall()
-            column_names = [desc[0] for desc in cursor.description]
-            return [list(row) for row in rows], column_names
+        if conn is None:
+            with get_pooled_connection() as pooled_conn:
+                return _fetch_with_server_cursor(pooled_conn, sql_query)
+        try:
+            return _fetch_with_server_cursor(conn, sql_query)
+        finally:
+            conn.rollback() # End the read transaction (or clear an aborted one) so conn stays reusable
+    except psycopg2.pool.PoolError as e:
+        print(f"    Failed to get database connection: {e}")
+        return None, None, False
     except psycopg2.Error as e:
         # Added specific error message for SQL execution issues
         print(f"SQL execution error: {e.pgcode} - {e.pgerror} for query:\n{sql_query}")
-        return None, None
-    finally:
-        if conn:
-            conn.close()
+        return None, None, False
+
+def execute_many_and_fetch(sql_queries: list, conn=None) -> list:
+    """
+    Executes several SQL queries on a single DB connection and returns a list
+    of (data, column_names) tuples in the same order as the queries.
+    A failing query yields (None, None) without affecting the others.
+    Uses conn if given (without closing it), otherwise a pooled connection.
+    """
+    results = []
+    try:
+        if conn is None:
+            with get_pooled_connection() as pooled_conn:
+                _fetch_many(pooled_conn, sql_queries, results)
+        else:
+            _fetch_many(conn, sql_queries, results)
+    except psycopg2.Error as e:
+        print(f"    Failed to get database connection: {e}")
+    # Pad with failures if the connection itself could not be used
+    results.extend([(None, None)] * (len(sql_queries) - len(results)))
+    return results
+
+def _fetch_many(conn, sql_queries: list, results: list):
+    """Appends a (data, column_names) tuple to results for each query run on conn."""
+    with conn.cursor() as cursor:
+        for sql_query in sql_queries:
+            try:
+                cursor.execute(sql_query)
+                rows = cursor.fetchall()
+                column_names = [desc[0] for desc in cursor.description]
+                results.append((rows, column_names))
+            except psycopg2.Error as e:
+                print(f"SQL execution error: {e.pgcode} - {e.pgerror} for query:\n{sql_query}")
+                conn.rollback() # Clear the aborted transaction so later queries can run
+                results.append((None, None))
+    conn.rollback() # End the read transaction so conn stays reusable
+
+def _group_columns_by_type(columns: list, gen_dtypes, exp_dtypes):
+    """
+    Splits columns into (numeric, datetime, other) groups based on the dtypes of
+    both result sets. A column is numeric only if it is numeric on both sides,
+    and datetime if it is datetime on either side.
+    """
+    gen_dtypes = dict(gen_dtypes.items())
+    exp_dtypes = dict(exp_dtypes.items())
+    num_cols, dt_cols, str_cols = [], [], []
+    for col in columns:
+        gen_dtype, exp_dtype = gen_dtypes[col], exp_dtypes[col]
+        if pd.api.types.is_numeric_dtype(gen_dtype) and pd.api.types.is_numeric_dtype(exp_dtype):
+            num_cols.append(col)
+        elif pd.api.types.is_datetime64_any_dtype(gen_dtype) or pd.api.types.is_datetime64_any_dtype(exp_dtype):
+            dt_cols.append(col)
+        else:
+            str_cols.append(col)
+    return num_cols, dt_cols, str_cols
+
+def _normalize_column_groups(df: pd.DataFrame, num_cols: list, dt_cols: list, str_cols: list) -> pd.DataFrame:
+    """
+    Normalizes values for comparison, one vectorized call per column group:
+    numbers become floats rounded to 6 places, dates become 'YYYY-MM-DD'
+    strings, and everything else becomes strings with missing values as ''.
+    """
+    df = df.copy()
+    if num_cols:
+        df[num_cols] = df[num_cols].astype(np.float64).round(6)
+    if dt_cols:
+        df[dt_cols] = df[dt_cols].apply(
+            lambda s: pd.to_datetime(s).dt.normalize().dt.strftime('%Y-%m-%d')
+        ).fillna('')
+    if str_cols:
+        df[str_cols] = df[str_cols].astype("string").fillna('')
+    return df
+
+def compare_results(generated_data: list, generated_cols: list, expected_data: list, expected_cols: list,
+                    truncated: bool = False) -> bool:
+    """
+    Compares two sets of SQL query results robustly, focusing on result equivalence.
+    A truncated generated result is never declared equal, since only part of it was fetched.
+    """
+    if truncated:
+        print(f"    Result comparison failed: Generated result was truncated at {MAX_RESULT_ROWS} rows.")
+        return False
 
-def compare_results(generated_data: list, generated_cols: list, expected_data: list, expected_cols: list) -> bool:
-    """Compares two sets of SQL query results robustly, focusing on result equivalence."""
     # Handle cases where one or both queries failed to execute or returned no data
     if generated_data is None and expected_data is None:
         return True # Both failed/returned None, treat as a match for this specific scenario
@@ -63,44 +211,35 @@ def compare_results(generated_data: list, generated_cols: list, expected_data: l
         exp_df = pd.DataFrame(expected_data, columns=expected_cols)
 
         # Normalize column names to lowercase for robust comparison
-        gen_df.columns = [col.lower() for col in gen_df.columns]
-        exp_df.columns = [col.lower() for col in exp_df.columns]
-
-        # Check if column sets are identical (order doesn't matter here)
-        if set(gen_df.columns) != set(exp_df.columns):
-            print(f"    Column set mismatch. Generated: {sorted(gen_df.columns)}, Expected: {sorted(exp_df.columns)}")
-            return False
-
-        # Ensure consistent column order for comparison by selecting and reordering
-        common_cols = sorted(list(set(gen_df.columns) & set(exp_df.columns)))
-        gen_df = gen_df[common_cols]
-        exp_df = exp_df[common_cols]
-
-        # Type conversion and normalization for robust comparison of values
-        for col in common_cols:
-            # Handle numeric types for floating point comparison tolerance
-            if pd.api.types.is_numeric_dtype(gen_df[col]) and pd.api.types.is_numeric_dtype(exp_df[col]):
-                # Convert to float and round for consistent precision
-                gen_df[col] = gen_df[col].astype(float).round(6) 
-                exp_df[col] = exp_df[col].astype(float).round(6)
-            
-            # Handle datetime/date types for consistent string representation
-            elif pd.api.types.is_datetime64_any_dtype(gen_df[col]) or pd.api.types.is_datetime64_any_dtype(exp_df[col]):
-                # Convert to string format 'YYYY-MM-DD' after normalizing to remove time
-                gen_df[col] = pd.to_datetime(gen_df[col]).dt.normalize().dt.strftime('%Y-%m-%d').fillna('')
-                exp_df[col] = pd.to_datetime(exp_df[col]).dt.normalize().dt.strftime('%Y-%m-%d').fillna('')
-            
-            # Ensure all other types are consistent and handle potential None/NaN values by converting to empty string
-            else:
-                gen_df[col] = gen_df[col].astype(str).fillna('').replace('nan', '')
-                exp_df[col] = exp_df[col].astype(str).fillna('').replace('nan', '')
-        
-        # Convert DataFrames to sorted lists of tuples for robust multiset comparison.
-        # This correctly handles row order differences and duplicate rows.
-        generated_tuples = [tuple(row) for row in gen_df.sort_values(by=common_cols).values]
-        expected_tuples = [tuple(row) for row in exp_df.sort_values(by=common_cols).values]
-
-        return generated_tuples == expected_tuples
+        gen_cols = [col.lower() for col in gen_df.columns]
+        exp_cols = [col.lower() for col in exp_df.columns]
+        gen_df.columns = gen_cols
+        exp_df.columns = exp_cols
+
+        # Fast path: both queries usually select columns in the same order.
+        # Otherwise fall back to comparing column sets (order doesn't matter
+        # here) and reorder the expected result to match the generated one.
+        common_cols = gen_cols
+        if gen_cols != exp_cols:
+            if set(gen_cols) != set(exp_cols):
+                print(f"    Column set mismatch. Generated: {sorted(gen_cols)}, Expected: {sorted(exp_cols)}")
+                return False
+            exp_df = exp_df[common_cols]
+
+        # Type conversion and normalization for robust comparison of values.
+        # Columns are grouped by type category once, then each group is
+        # normalized with a single vectorized call per DataFrame.
+        num_cols, dt_cols, str_cols = _group_columns_by_type(common_cols, gen_df.dtypes, exp_df.dtypes)
+        gen_df = _normalize_column_groups(gen_df, num_cols, dt_cols, str_cols)
+        exp_df = _normalize_column_groups(exp_df, num_cols, dt_cols, str_cols)
+
+        # Hash each row to a single uint64 and compare the sorted hash arrays.
+        # This is a multiset comparison: it handles row order differences and
+        # duplicate rows while keeping all the heavy work inside NumPy.
+        generated_hashes = np.sort(pd.util.hash_pandas_object(gen_df, index=False).values)
+        expected_hashes = np.sort(pd.util.hash_pandas_object(exp_df, index=False).values)
+
+        return generated_hashes.shape == expected_hashes.shape and np.array_equal(generated_hashes, expected_hashes)
 
     except Exception as e:
         print(f"Error during robust result comparison: {e}")
@@ -108,18 +247,20 @@ def compare_results(generated_data: list, generated_cols: list, expected_data: l
 
 def calculate_execution_accuracy(generated_sql: str, expected_sql: str, 
                                  expected_result_data: list, expected_result_cols: list,
-                                 generated_data: list = None, generated_cols: list = None) -> float:
+                                 generated_data: list = None, generated_cols: list = None,
+                                 generated_truncated: bool = False) -> float:
     """
     Calculates execution accuracy.
-    Optionally accepts pre-fetched generated_data and generated_cols to avoid re-execution.
+    Optionally accepts pre-fetched generated_data, generated_cols and generated_truncated to avoid re-execution.
     """
     # If generated_data/cols are not pre-provided, execute the generated SQL
     if generated_data is None or generated_cols is None:
-        generated_data, generated_cols = execute_sql_and_fetch(generated_sql)
+        generated_data, generated_cols, generated_truncated = execute_sql_and_fetch(generated_sql)
 
     if generated_data is None:
         print("    Generated SQL failed to execute.")
         return 0.0
 
     # Use the robust compare_results function
-    return 1.0 if compare_results(generated_data, generated_cols, expected_result_data, expected_result_cols) else 0.0
\ No newline at end of file
+    return 1.0 if compare_results(generated_data, generated_cols, expected_result_data, expected_result_cols,
+                                  truncated=generated_truncated) else 0.0
\ No newline at end of file
@@ -1,9 +1,21 @@
 import os
+import asyncio
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import ReadTimeoutError
 import re
+import sqlglot
+import json
+import orjson
+import hashlib
+import shelve
+import threading
+import time
 # Assuming prompt_builder is in the same directory or accessible via sys.path
-from prompt_builder import interactive_schema_validation, process_schema_response
+from prompt_builder import interactive_schema_validation, process_schema_response, direct_sql
+from semantic_cache import semantic_cache
 
 load_dotenv()
 
@@ -12,6 +24,104 @@ openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
 if not openrouter_api_key:
     raise EnvironmentError("OPENROUTER_API_KEY IS NOT FOUND IN ENV VARIABLES. Please set it in your .env file.")
 
+# Seconds to wait for OpenRouter before giving up: to connect, then to read
+# (per read when streaming)
+LLM_CONNECT_TIMEOUT = 5.0
+LLM_TIMEOUT = float(os.getenv("OPENROUTER_TIMEOUT", "30"))
+
+# --- Persistent LLM response cache ---
+# Deterministic (temperature 0) responses are keyed by a hash of the model,
+# messages and temperature and kept both in memory and in a shelve file, so
+# repeated evaluation runs and reconfirmation loops skip the OpenRouter round
+# trip. Entries expire after LLM_CACHE_TTL seconds.
+# Set NL2SQL_NO_CACHE=1 to bypass the cache entirely.
+LLM_CACHE_PATH = os.getenv("NL2SQL_LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_TTL = 86400 # One day
+
+_llm_memory_cache = {}
+_llm_cache_lock = threading.Lock()
+
+def _llm_cache_enabled() -> bool:
+    return os.getenv("NL2SQL_NO_CACHE") != "1"
+
+def _llm_cache_key(model_name: str, prompt_messages: list, temperature: float) -> str:
+    key_data = json.dumps({"m": model_name, "msgs": prompt_messages, "t": temperature}, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(key_data.encode()).hexdigest()
+
+def _llm_cache_get(key: str):
+    """
+    Returns the cached response content for key, or None on a miss or expired entry.
+    """
+    with _llm_cache_lock:
+        entry = _llm_memory_cache.get(key)
+        if entry is None:
+            try:
+                with shelve.open(LLM_CACHE_PATH) as cache:
+                    entry = cache.get(key)
+            except Exception as e:
+                print(f"⚠️ Could not read LLM cache: {e}")
+                return None
+            if not isinstance(entry, dict):
+                return None
+            _llm_memory_cache[key] = entry
+        if entry["expires_at"] < time.time():
+            return None
+        return entry["content"]
+
+def _llm_cache_set(key: str, content: str):
+    entry = {"content": content, "expires_at": time.time() + LLM_CACHE_TTL}
+    with _llm_cache_lock:
+        _llm_memory_cache[key] = entry
+        try:
+            with shelve.open(LLM_CACHE_PATH) as cache:
+                cache[key] = entry
+        except Exception as e:
+            print(f"⚠️ Could not write LLM cache: {e}")
+
+# Providers that only reuse a cached prompt prefix when it ends in an explicit
+# cache_control breakpoint. Others routed by OpenRouter (e.g. DeepSeek, OpenAI)
+# cache identical prefixes automatically.
+_EXPLICIT_CACHE_PROVIDERS = ("anthropic/", "google/gemini")
+
+def _with_cache_breakpoint(prompt_messages: list) -> list:
+    """
+    Returns a copy of the messages with a cache_control breakpoint on the last
+    message before the final user turn, i.e. the end of the static prompt prefix
+    (system message + few-shots) shared by every SQL generation prompt.
+    """
+    if len(prompt_messages) < 2 or not isinstance(prompt_messages[-2].get("content"), str):
+        return prompt_messages
+    messages = list(prompt_messages)
+    prefix_end = messages[-2]
+    messages[-2] = {
+        **prefix_end,
+        "content": [{"type": "text", "text": prefix_end["content"], "cache_control": {"type": "ephemeral"}}]
+    }
+    return messages
+
+def _answer_is_complete(text: str) -> bool:
+    """
+    Early-stop check for streamed answers. The prompt asks for SQL only, so once
+    a reply that opened with a code fence has closed all of its blocks and moved
+    on to prose, the rest is explanation that extract_sql_from_response ignores.
+    """
+    stripped = text.lstrip()
+    if not stripped.startswith(_FENCE) or stripped.count(_FENCE) % 2:
+        return False # Not a fenced answer, or a block is still open
+    trailing = stripped[stripped.rfind(_FENCE) + len(_FENCE):].lstrip()
+    return bool(trailing) and not trailing.startswith("`") # Another fence may be starting
+
+def _is_read_timeout(error: requests.exceptions.ConnectionError) -> bool:
+    """
+    Checks whether a ConnectionError is really a read timeout. requests wraps
+    urllib3's ReadTimeoutError in a ConnectionError both when the Retry adapter
+    gives up (inside a MaxRetryError) and when a streamed body stalls.
+    """
+    if not error.args:
+        return False
+    cause = getattr(error.args[0], "reason", error.args[0])
+    return isinstance(cause, ReadTimeoutError)
+
 class OpenRouterModel:
     def __init__(self, model_name: str):
         self.api_url = "https://openrouter.ai/api/v1/chat/completions"
@@ -20,33 +130,140 @@ class OpenRouterModel:
             "Content-Type": "application/json"
         }
         self.model_name = model_name
+        # One long-lived session per model so every call reuses the pooled
+        # keep-alive TCP/TLS connection instead of handshaking again.
+        # Rate limits and transient gateway errors are retried with backoff;
+        # POST must be allowed explicitly since urllib3 skips it by default.
+        # Read timeouts are not retried: a slow generation would only be re-sent
+        # (and re-billed) while the caller keeps waiting.
+        retry = Retry(
+            total=3,
+            read=0,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False # Let raise_for_status report the final response
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry))
+        self.session.headers.update(self.headers)
     
-    def invoke(self, prompt_messages: list):
+    def _build_payload(self, prompt_messages: list) -> dict:
         """
-        Sends a list of messages to the OpenRouter API and returns the response.
+        Builds the chat completion request body shared by invoke and invoke_stream.
         """
-        payload = {
+        if self.model_name.startswith(_EXPLICIT_CACHE_PROVIDERS):
+            prompt_messages = _with_cache_breakpoint(prompt_messages)
+        return {
             "model": self.model_name,
             "messages": prompt_messages,
-            "max_tokens": 500, # Max tokens for the model's response
+            "max_tokens": 256, # SQL answers are typically well under 150 tokens
             "temperature": 0.0, # Consistent output for SQL generation
             "stop": ["<|endoftext|>", "<|eot_id|>"] # Common stop tokens for some models
         }
+
+    def invoke(self, prompt_messages: list, stream: bool = False):
+        """
+        Sends a list of messages to the OpenRouter API and returns the response.
+        With stream=True the response is read as it is generated and the request
+        is cut off as soon as the SQL answer is complete (see _answer_is_complete).
+        """
+        payload = self._build_payload(prompt_messages)
+
+        # Only deterministic responses are cached; sampling should stay fresh
+        cache_key = None
+        if _llm_cache_enabled() and payload["temperature"] == 0:
+            cache_key = _llm_cache_key(self.model_name, prompt_messages, payload["temperature"])
+            cached_content = _llm_cache_get(cache_key)
+            if cached_content is not None:
+                print("✅ Using cached model response")
+                return cached_content
+
+        if stream:
+            content = ""
+            for delta in self.invoke_stream(prompt_messages):
+                content += delta
+                if _answer_is_complete(content):
+                    break # Closing the generator drops the rest of the response
+            if cache_key and content:
+                _llm_cache_set(cache_key, content) # Never cache an empty answer
+            return content
         
+        response = None
         try:
-            response = requests.post(self.api_url, headers=self.headers, json=payload)
+            # orjson serializes straight to bytes; the session already sends the
+            # application/json Content-Type header
+            response = self.session.post(self.api_url, data=orjson.dumps(payload),
+                                         timeout=(LLM_CONNECT_TIMEOUT, LLM_TIMEOUT))
             response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
             
-            result = response.json()
+            result = orjson.loads(response.content)
             if 'choices' in result and len(result['choices']) > 0 and 'message' in result['choices'][0]:
-                return result['choices'][0]['message'].get('content', '')
+                content = result['choices'][0]['message'].get('content', '')
+                if cache_key and content:
+                    _llm_cache_set(cache_key, content)
+                return content
             
             return str(result) # Return full result string if content not found
+        except requests.exceptions.Timeout as e:
+            raise TimeoutError(f"OpenRouter request timed out after {LLM_TIMEOUT:.0f}s") from e
+        except requests.exceptions.ConnectionError as e:
+            # Read timeouts arrive as a ConnectionError wrapping urllib3's MaxRetryError
+            if _is_read_timeout(e):
+                raise TimeoutError(f"OpenRouter request timed out after {LLM_TIMEOUT:.0f}s") from e
+            raise Exception(f"OpenRouter API Error: {e}") from e
+        except requests.exceptions.HTTPError as e:
+            # The error body may not be JSON; report its start as text
+            raise Exception(f"OpenRouter API Error: {response.status_code} - {e}\nDetails: {response.text[:500]}") from e
         except requests.exceptions.RequestException as e:
-            error_details = response.json() if response.content else "No response content"
-            raise Exception(f"OpenRouter API Error: {response.status_code if 'response' in locals() else 'N/A'} - {e}\nDetails: {error_details}")
-        except Exception as e:
-            raise Exception(f"An unexpected error occurred during OpenRouter API invocation: {e}")
+            raise Exception(f"OpenRouter API Error: {e}") from e
+
+    async def ainvoke(self, prompt_messages: list, stream: bool = False):
+        """
+        Async counterpart of invoke. Runs invoke in a worker thread so concurrent
+        calls share the session's connection pool, retries and response cache.
+        """
+        return await asyncio.to_thread(self.invoke, prompt_messages, stream)
+
+    def invoke_stream(self, prompt_messages: list):
+        """
+        Sends a list of messages to the OpenRouter API with streaming enabled and
+        yields the content deltas as they arrive (server-sent events).
+        """
+        payload = self._build_payload(prompt_messages)
+        payload["stream"] = True
+
+        try:
+            with self.session.post(self.api_url, data=orjson.dumps(payload), stream=True,
+                               timeout=(LLM_CONNECT_TIMEOUT, LLM_TIMEOUT)) as response:
+                response.raise_for_status()
+                for raw_line in response.iter_lines():
+                    line = raw_line.decode("utf-8") if isinstance(raw_line, bytes) else raw_line
+                    # Skip keep-alive blank lines and SSE comments (e.g. ": OPENROUTER PROCESSING")
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = orjson.loads(data)
+                    choices = chunk.get("choices") or []
+                    # Provider failures after the headers arrive as error frames
+                    # on a 200 stream; surface them instead of ending quietly
+                    if chunk.get("error") or (choices and choices[0].get("finish_reason") == "error"):
+                        raise Exception(f"OpenRouter API Error (streaming): {chunk.get('error') or 'finish_reason=error'}")
+                    if choices:
+                        delta = choices[0].get("delta", {}).get("content")
+                        if delta:
+                            yield delta
+        except requests.exceptions.Timeout as e:
+            raise TimeoutError(f"OpenRouter request timed out after {LLM_TIMEOUT:.0f}s") from e
+        except requests.exceptions.ConnectionError as e:
+            # Read timeouts, before the headers or mid-stream, arrive as a ConnectionError
+            if _is_read_timeout(e):
+                raise TimeoutError(f"OpenRouter request timed out after {LLM_TIMEOUT:.0f}s") from e
+            raise Exception(f"OpenRouter API Error (streaming): {e}") from e
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"OpenRouter API Error (streaming): {e}") from e
 
     def invoke_simple(self, prompt_text: str):
         """
@@ -64,64 +281,120 @@ except Exception as e:
     # Re-raise to stop execution if LLM fails to load, as it's critical
     raise RuntimeError(f"FAILED TO LOAD OPENROUTER MODEL: {e}")
 
+# SQL statement keywords recognised by extract_sql_from_response
+_KEYWORDS = frozenset({'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'WITH'})
+_KEYWORD_PREFIX_LEN = max(len(k) for k in _KEYWORDS) + 1 # Longer words can't be keywords
+_LEADING_WORD_RE = re.compile(r'\w+')
+_LEADING_NOISE_RE = re.compile(r'(?:\s+|\(|--[^\n]*|/\*.*?\*/)*', re.DOTALL) # Whitespace, parens, comments
+_FENCE = "```"
+_INFO_STRING_RE = re.compile(r'[\w+-]*\s*') # Bare language tag after an opening fence
+
+def _starts_with_sql_keyword(stmt: str, pos: int = 0) -> bool:
+    """
+    Checks whether the word at pos is a SQL keyword, reading at most a few
+    characters and doing a single set lookup.
+    """
+    match = _LEADING_WORD_RE.match(stmt, pos, pos + _KEYWORD_PREFIX_LEN)
+    return match is not None and match.group().upper() in _KEYWORDS
+
+def _has_sql_keyword(block: str) -> bool:
+    """
+    Checks whether a code block opens with a SQL statement, skipping any
+    leading comments or parentheses (e.g. "-- Top customers\nSELECT ...").
+    """
+    return _starts_with_sql_keyword(block, _LEADING_NOISE_RE.match(block).end())
+
+def _split_markdown(text: str):
+    """
+    Walks the text once, splitting it into fenced code block contents and the
+    plain text outside them. An unclosed fence is left as plain text.
+
+    Returns:
+        tuple: (list of stripped code block contents, plain text outside blocks)
+    """
+    blocks = []
+    plain_parts = []
+    pos = 0
+    while True:
+        start = text.find(_FENCE, pos)
+        end = text.find(_FENCE, start + len(_FENCE)) if start != -1 else -1
+        if end == -1:
+            plain_parts.append(text[pos:])
+            break
+        plain_parts.append(text[pos:start])
+        block = text[start + len(_FENCE):end]
+        newline = block.find("\n")
+        if newline != -1:
+            # Drop the fence's language tag line (sql, SQL, postgresql, pgsql, ...),
+            # but keep a first line that is SQL, e.g. ```SELECT a\nFROM t```
+            first_line = block[:newline]
+            if _INFO_STRING_RE.fullmatch(first_line) and not _starts_with_sql_keyword(first_line):
+                block = block[newline + 1:]
+        elif block.startswith("sql"): # Single-line block such as ```sql SELECT 1```
+            block = block[3:]
+        blocks.append(block.strip())
+        pos = end + len(_FENCE)
+    return blocks, "".join(plain_parts)
+
+def _parse_statements(candidate: str) -> list:
+    """
+    Parses a candidate SQL snippet with sqlglot and returns each statement
+    regenerated in canonical PostgreSQL form, or an empty list if it is not
+    valid SQL (e.g. prose, or a query cut off mid-statement).
+    """
+    try:
+        return [stmt.sql(dialect="postgres", pretty=True)
+                for stmt in sqlglot.parse(candidate, read="postgres") if stmt is not None]
+    except sqlglot.errors.SqlglotError:
+        print(f"⚠️ Skipping snippet that does not parse as SQL: {candidate[:80]!r}")
+        return []
+
 def extract_sql_from_response(response_text: str) -> list:
     """
     Extracts SQL queries from the model response.
-    Handles both markdown code blocks and plain text SQL.
+    Handles both markdown code blocks and plain text SQL. Candidates that pass
+    the keyword check are validated by parsing them with sqlglot.
     """
-    cleaned_response = response_text.strip()
+    markdown_blocks, plain_text = _split_markdown(response_text.strip())
+
+    # First, use SQL found in markdown code blocks
     sql_queries = []
-    
-    # First, try to find SQL in markdown code blocks
-    markdown_blocks = re.findall(r'```(?:sql)?\s*(.*?)\s*```', cleaned_response, re.DOTALL)
     for block in markdown_blocks:
-        stripped_block = block.strip()
-        if stripped_block:
-            sql_queries.append(stripped_block)
-    
+        if block and _has_sql_keyword(block):
+            sql_queries.extend(_parse_statements(block))
+    if sql_queries:
+        return sql_queries
+
     # If no markdown blocks found, look for plain SQL statements
-    if not sql_queries:
-        text_without_markdown = re.sub(r'```(?:sql)?\s*(.*?)\s*```', '', cleaned_response, flags=re.DOTALL)
-        potential_plain_statements = [s.strip() for s in text_without_markdown.split(';') if s.strip()]
-        
-        for stmt in potential_plain_statements:
-            if re.match(r'^(SELECT|INSERT|UPDATE|DELETE|CREATE|WITH)\b', stmt, re.IGNORECASE | re.DOTALL):
-                if stmt not in sql_queries: # Avoid adding duplicates if split by semicolon includes existing markdown
-                    sql_queries.append(stmt)
+    for stmt in plain_text.split(';'):
+        stmt = stmt.strip()
+        if stmt and _starts_with_sql_keyword(stmt):
+            for query in _parse_statements(stmt):
+                if query not in sql_queries:
+                    sql_queries.append(query)
 
-    # Filter to only valid SQL queries (ensure they contain SQL keywords)
-    final_sql_queries = [
-        q for q in sql_queries 
-        if q and any(keyword in q.upper() for keyword in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'WITH'])
-    ]
+    return sql_queries
 
-    return final_sql_queries if final_sql_queries else []
+def _to_prompt_messages(prompt) -> list:
+    """
+    Converts a string prompt to the chat message format; lists are passed through.
+    """
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt.strip()}]
+    elif isinstance(prompt, list):
+        return prompt
+    raise ValueError("Prompt must be a string or a list of messages (chat format).")
 
-# The new, more flexible generate_sql function (as provided by you)
-def generate_sql(prompt: str or list) -> list:
+def _generate_sql_messages(prompt_messages: list) -> list:
     """
-    Generates SQL using the LLM.
-    Accepts either a string (NL prompt) or a list of messages (for OpenRouter chat format).
+    Fast path of generate_sql for chat messages that are known to be non-empty,
+    such as the prompts built by process_schema_response.
     """
+    model_name = llm.model_name
     try:
-        print(f"🔄 Sending prompt to OpenRouter ({llm.model_name})...")
-
-        # Convert string prompt to message format if necessary
-        if isinstance(prompt, str):
-            prompt_messages = [{"role": "user", "content": prompt.strip()}]
-        elif isinstance(prompt, list):
-            prompt_messages = prompt
-        else:
-            raise ValueError("Prompt must be a string or a list of messages (chat format).")
-
-        # Check for at least one non-empty message before sending to LLM
-        non_empty_msgs = [m for m in prompt_messages if m.get("content", "").strip()]
-        if not non_empty_msgs:
-            # Return an empty list or an error message to signify no SQL could be generated
-            print("⚠️ Warning: Prompt contains no usable content for LLM after stripping. Skipping API call.")
-            return ["-- Error: Prompt contained no valid input tokens. --"]
+        print(f"🔄 Sending prompt to OpenRouter ({model_name})...")
 
-        raw_response = llm.invoke(prompt_messages)
+        raw_response = llm.invoke(prompt_messages, stream=True)
         
         print(f"✅ Model responded successfully")
         print(f"📤 Raw response: {raw_response}")
@@ -135,6 +408,39 @@ def generate_sql(prompt: str or list) -> list:
         print(f"❌ Error type: {type(e)}")
         return [f"-- Error: {str(e)} --"]
 
+# The new, more flexible generate_sql function (as provided by you)
+def generate_sql(prompt: str or list) -> list:
+    """
+    Generates SQL using the LLM.
+    Accepts either a string (NL prompt) or a list of messages (for OpenRouter chat format).
+    """
+    try:
+        prompt_messages = _to_prompt_messages(prompt)
+    except ValueError as e:
+        print(f"❌ Error generating SQL: {str(e)}")
+        return [f"-- Error: {str(e)} --"]
+
+    # Check for at least one non-empty message before sending to LLM
+    if not any(m.get("content", "").strip() for m in prompt_messages):
+        # Return an empty list or an error message to signify no SQL could be generated
+        print("⚠️ Warning: Prompt contains no usable content for LLM after stripping. Skipping API call.")
+        return ["-- Error: Prompt contained no valid input tokens. --"]
+
+    return _generate_sql_messages(prompt_messages)
+
+def generate_sql_stream(prompt: str or list):
+    """
+    Streaming counterpart of generate_sql: yields raw response text deltas as the
+    model produces them. Callers accumulate the text and pass it to
+    extract_sql_from_response once the stream ends.
+    """
+    prompt_messages = _to_prompt_messages(prompt)
+    if not any(m.get("content", "").strip() for m in prompt_messages):
+        raise ValueError("Prompt contains no usable content for LLM.")
+
+    print(f"🔄 Streaming prompt to OpenRouter ({llm.model_name})...")
+    yield from llm.invoke_stream(prompt_messages)
+
 # --- Functions for interactive flow and automated testing ---
 
 def interactive_sql_generation(nl_query: str, user_input_function=input) -> dict:
@@ -184,13 +490,14 @@ def interactive_sql_generation(nl_query: str, user_input_function=input) -> dict
                 # Schema confirmed, generate SQL using the unified generate_sql
                 print("\n✅ Schema confirmed! Generating SQL query...")
                 
-                # Use the new, unified generate_sql function here
-                sql_queries = generate_sql(processed_result["prompt"]) 
+                # The prompt builder always produces non-empty messages
+                sql_queries = _generate_sql_messages(processed_result["prompt"])
                 
                 return {
                     "success": True,
                     "sql_queries": sql_queries,
                     "confirmed_schema": processed_result["schema"],
+                    "schema_sig": processed_result["schema_sig"],
                     "nl_query": nl_query
                 }
             
@@ -212,8 +519,7 @@ def interactive_sql_generation(nl_query: str, user_input_function=input) -> dict
         # Max attempts reached, fallback to original schema and generate SQL
         print(f"❌ Maximum attempts ({max_attempts}) reached. Using original schema as fallback.")
         fallback_result = process_schema_response("CONFIRMED", result["schema"], nl_query)
-        # Use the new, unified generate_sql function here for fallback
-        sql_queries = generate_sql(fallback_result["prompt"]) 
+        sql_queries = _generate_sql_messages(fallback_result["prompt"])
         
         return {
             "success": False,
@@ -240,22 +546,32 @@ def generate_sql_with_auto_confirm(nl_query: str) -> dict:
     Skips the interactive schema validation step.
     """
     try:
-        # Get schema validation result
-        result = interactive_schema_validation(nl_query)
-        
-        if result["step"] != "schema_confirmation":
-            return {"error": "Failed to fetch schema", "sql_queries": []}
-        
-        # Auto-confirm schema
-        processed_result = process_schema_response("CONFIRMED", result["schema"], nl_query)
+        # Build the generation prompt directly; there is no confirmation to ask for
+        processed_result = direct_sql(nl_query)
         
         if processed_result["step"] == "sql_generation":
-            # Use the new, unified generate_sql function here
-            sql_queries = generate_sql(processed_result["prompt"])
+            # A paraphrase of an earlier question against the same schema can
+            # reuse its SQL without calling the LLM (opt-in semantic cache)
+            schema_sig = processed_result["schema_sig"]
+            sql_queries = None
+            if semantic_cache:
+                try:
+                    sql_queries = semantic_cache.lookup(nl_query, schema_sig)
+                except Exception as e:
+                    print(f"⚠️ Semantic cache lookup failed: {e}")
+            if sql_queries is None:
+                sql_queries = _generate_sql_messages(processed_result["prompt"])
+                if semantic_cache and sql_queries and not sql_queries[0].startswith("-- Error"):
+                    # A cache failure must never replace an answer already generated
+                    try:
+                        semantic_cache.add(nl_query, schema_sig, sql_queries)
+                    except Exception as e:
+                        print(f"⚠️ Could not store SQL in semantic cache: {e}")
             return {
                 "success": True,
                 "sql_queries": sql_queries,
                 "confirmed_schema": processed_result["schema"],
+                "schema_sig": schema_sig,
                 "nl_query": nl_query
             }
         else:
@@ -267,4 +583,20 @@ def generate_sql_with_auto_confirm(nl_query: str) -> dict:
             "error": str(e),
             "sql_queries": [],
             "nl_query": nl_query
-        }
\ No newline at end of file
+        }
+
+# --- Async API for batch evaluation ---
+# These run the blocking calls above in worker threads, so many requests can be
+# awaited together with asyncio.gather while the sync API stays unchanged.
+
+async def agenerate_sql(prompt: str or list) -> list:
+    """
+    Async counterpart of generate_sql.
+    """
+    return await asyncio.to_thread(generate_sql, prompt)
+
+async def agenerate_sql_with_auto_confirm(nl_query: str) -> dict:
+    """
+    Async counterpart of generate_sql_with_auto_confirm.
+    """
+    return await asyncio.to_thread(generate_sql_with_auto_confirm, nl_query)
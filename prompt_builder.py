@@ -1,10 +1,47 @@
+import hashlib
+import re
+import threading
+import time
 import psycopg2
 from psycopg2 import sql
 
 # IMPORTANT: Import fetch_schema from db_connector.py
 # This ensures that schema fetching uses your environment variables
 # and the centralized connection logic.
-from db_connector import fetch_schema
+from db_connector import fetch_schema, refresh_schema
+
+# In-process schema cache shared by every NL query, so repeated questions don't
+# each go back to fetch_schema. Call invalidate_schema_cache() after DDL changes.
+_SCHEMA_CACHE = {"ts": 0.0, "val": None, "force": False}
+_SCHEMA_CACHE_TTL = 60.0 # Seconds
+_schema_cache_lock = threading.Lock()
+
+def _cached_schema():
+    """
+    Returns the database schema, refetching it at most once per _SCHEMA_CACHE_TTL.
+    Empty results (e.g. a failed fetch) are not cached.
+    """
+    with _schema_cache_lock:
+        now = time.monotonic()
+        if _SCHEMA_CACHE["force"]:
+            # After invalidation the on-disk copy may be stale too, so go to the DB
+            _SCHEMA_CACHE["val"] = refresh_schema()
+            _SCHEMA_CACHE["ts"] = now
+            _SCHEMA_CACHE["force"] = not _SCHEMA_CACHE["val"] # Retry on the next call if it failed
+        elif not _SCHEMA_CACHE["val"] or now - _SCHEMA_CACHE["ts"] > _SCHEMA_CACHE_TTL:
+            _SCHEMA_CACHE["val"] = fetch_schema()
+            _SCHEMA_CACHE["ts"] = now
+        return _SCHEMA_CACHE["val"]
+
+def invalidate_schema_cache():
+    """
+    Drops the in-process schema cache so the next query refetches the schema
+    from the database, bypassing (and updating) the on-disk schema cache.
+    """
+    with _schema_cache_lock:
+        _SCHEMA_CACHE["val"] = None
+        _SCHEMA_CACHE["ts"] = 0.0
+        _SCHEMA_CACHE["force"] = True
 
 
 def format_schema_for_display(schema):
@@ -14,14 +51,13 @@ def format_schema_for_display(schema):
     if not schema:
         return "No tables found in the database."
 
-    formatted = "📋 **Database Schema Detected:**\n\n"
+    parts = ["📋 **Database Schema Detected:**\n\n"]
     for table_name, columns in schema.items():
-        formatted += f"**Table: {table_name}**\n"
-        for col_name, col_type in columns:
-            formatted += f"  - {col_name} ({col_type})\n"
-        formatted += "\n"
+        parts.append(f"**Table: {table_name}**\n")
+        parts.extend(f"  - {col_name} ({col_type})\n" for col_name, col_type in columns)
+        parts.append("\n")
 
-    return formatted
+    return "".join(parts)
 
 def build_schema_confirmation_prompt(schema, nl_query):
     """
@@ -51,50 +87,57 @@ Your response:"""
 
     return prompt
 
+# Correction patterns matched against lowercased lines of the user's response,
+# e.g. "Table X doesn't exist, use Table Y instead" and
+# "Column A in Table B doesn't exist, use Column C instead"
+_TABLE_CORRECTION_RE = re.compile(r"table\s+(\w+)\s+doesn't exist.*\buse\s+(?:table\s+)?(\w+)")
+_COLUMN_CORRECTION_RE = re.compile(r"column\s+(\w+)\b.*doesn't exist.*\buse\s+(?:column\s+)?(\w+)")
+
 def parse_schema_corrections(user_response, original_schema):
     """
     Parses user corrections and updates the schema accordingly.
     Returns updated schema dictionary.
+
+    All corrections are collected into table and column rename maps first, then
+    applied to the schema in a single pass. Column renames apply to every table.
     """
     if user_response.strip().upper() == "CONFIRMED":
         return original_schema, True
 
-    # Create a copy of the original schema to modify
-    updated_schema = original_schema.copy()
-    corrections_applied = []
+    table_renames = {}
+    col_renames = {} # Keyed by lowercased old column name
 
-    lines = user_response.strip().split('\n')
-    for line in lines:
+    for line in user_response.strip().split('\n'):
         line = line.strip().lower()
 
-        # Handle table corrections
-        if "table" in line and "doesn't exist" in line:
-            # Extract table names (this is a simplified parser)
-            words = line.split()
-            if "use" in words:
-                old_table = words[words.index("table") + 1]
-                new_table = words[words.index("use") + 1]
-                if old_table in updated_schema:
-                    updated_schema[new_table] = updated_schema.pop(old_table)
-                    corrections_applied.append(f"Renamed table '{old_table}' to '{new_table}'")
-
-        # Handle column corrections
-        elif "column" in line and "doesn't exist" in line:
-            # Simplified column correction parser
-            words = line.split()
-            if "use" in words:
-                old_col = words[words.index("column") + 1]
-                new_col = words[words.index("use") + 1]
-                # Find and replace column in all tables
-                for table_name, columns in updated_schema.items():
-                    updated_columns = []
-                    for col_name, col_type in columns:
-                        if col_name.lower() == old_col.lower():
-                            updated_columns.append((new_col, col_type))
-                            corrections_applied.append(f"Renamed column '{old_col}' to '{new_col}' in table '{table_name}'")
-                        else:
-                            updated_columns.append((col_name, col_type))
-                    updated_schema[table_name] = updated_columns
+        # Column corrections are checked first since they may also mention a table
+        column_match = _COLUMN_CORRECTION_RE.search(line)
+        if column_match:
+            old_col, new_col = column_match.groups()
+            col_renames[old_col] = new_col
+            continue
+
+        table_match = _TABLE_CORRECTION_RE.search(line)
+        if table_match:
+            old_table, new_table = table_match.groups()
+            if old_table in original_schema:
+                table_renames[old_table] = new_table
+
+    if not col_renames:
+        # Table renames only: copy the column lists without visiting each column
+        updated_schema = {
+            table_renames.get(table_name, table_name): list(columns)
+            for table_name, columns in original_schema.items()
+        }
+        return updated_schema, False
+
+    # Each column name is lowercased once and looked up in the rename map
+    updated_schema = {
+        table_renames.get(table_name, table_name): [
+            (col_renames.get(col_name.lower(), col_name), col_type) for col_name, col_type in columns
+        ]
+        for table_name, columns in original_schema.items()
+    }
 
     return updated_schema, False
 
@@ -105,20 +148,24 @@ def build_schema_context_string(schema):
     if not schema:
         return "No schema information available."
 
-    schema_str = ""
+    parts = []
     for table, columns in schema.items():
         if columns:  # Skip tables with no columns
             col_names = [col[0] for col in columns]  # Extract just column names
-            schema_str += f"Table: {table}\nColumns: {', '.join(col_names)}\n\n"
+            parts.append(f"Table: {table}\nColumns: {', '.join(col_names)}\n\n")
 
-    return schema_str
+    return "".join(parts)
 
-def build_sql_generation_prompt(nl_query, confirmed_schema):
+def schema_signature(schema):
     """
-    Builds the final prompt for SQL generation using the confirmed schema.
+    Returns a short, order-independent hash of the schema's tables and columns,
+    used to key caches so answers are never reused across different schemas.
     """
-    # System message with PostgreSQL-specific instructions
-    system_msg = """You are an expert SQL developer specialized in writing complex PostgreSQL queries from natural language input.
+    canonical = sorted((table, tuple(sorted(columns))) for table, columns in schema.items())
+    return hashlib.blake2b(repr(canonical).encode(), digest_size=16).hexdigest()
+
+# System message with PostgreSQL-specific instructions
+_SYSTEM_MSG = """You are an expert SQL developer specialized in writing complex PostgreSQL queries from natural language input.
 
 IMPORTANT PostgreSQL Syntax Rules:
 1. Use || for string concatenation, NOT CONCAT()
@@ -137,11 +184,11 @@ IMPORTANT PostgreSQL Syntax Rules:
 4. Only use tables and columns that exist in the provided schema.
 5. Return only the SQL query without additional explanation unless requested."""
 
-    # Few-shot examples (same as before but with PostgreSQL syntax)
-    few_shots = [
-        {
-            "user": "For each month in the last year, list the top 2 salespeople by total revenue generated.",
-            "assistant": """WITH monthly_revenue AS (
+# Few-shot examples (same as before but with PostgreSQL syntax), stored as the
+# user/assistant chat messages they are sent as
+_FEW_SHOT_MSGS = (
+    {"role": "user", "content": "For each month in the last year, list the top 2 salespeople by total revenue generated."},
+    {"role": "assistant", "content": """WITH monthly_revenue AS (
     SELECT
         salesperson_id,
         DATE_TRUNC('month', sale_date) AS sale_month,
@@ -158,15 +205,22 @@ ranked_sales AS (
 SELECT sale_month, salesperson_id, total_revenue
 FROM ranked_sales
 WHERE rank <= 2
-ORDER BY sale_month, rank;"""
-        },
-        {
-            "user": "Show me the full name of customers from the customers table.",
-            "assistant": """SELECT first_name || ' ' || last_name AS full_name
-FROM customers;"""
-        }
-    ]
+ORDER BY sale_month, rank;"""},
+    {"role": "user", "content": "Show me the full name of customers from the customers table."},
+    {"role": "assistant", "content": """SELECT first_name || ' ' || last_name AS full_name
+FROM customers;"""},
+)
+
+# Static prompt prefix shared by every SQL generation prompt. Sending the exact
+# same leading messages lets providers that support prompt caching reuse it.
+# Only the sequence is frozen; build_sql_generation_prompt hands out copies of
+# the message dicts so callers can't modify the shared prefix.
+_STATIC_PREFIX = ({"role": "system", "content": _SYSTEM_MSG}, *_FEW_SHOT_MSGS)
 
+def build_sql_generation_prompt(nl_query, confirmed_schema):
+    """
+    Builds the final prompt for SQL generation using the confirmed schema.
+    """
     # Schema string formatting
     schema_str = build_schema_context_string(confirmed_schema)
 
@@ -181,14 +235,8 @@ Translate this natural language query into a PostgreSQL SQL statement:
 
 Remember to use PostgreSQL syntax (|| for concatenation, INTERVAL for dates, etc.)."""
 
-    # Final prompt object (chat format)
-    messages = [{"role": "system", "content": system_msg}]
-    for ex in few_shots:
-        messages.append({"role": "user", "content": ex["user"]})
-        messages.append({"role": "assistant", "content": ex["assistant"]})
-    messages.append({"role": "user", "content": final_user_input})
-
-    return messages
+    # Final prompt object (chat format): the shared static prefix plus this query
+    return [*(dict(message) for message in _STATIC_PREFIX), {"role": "user", "content": final_user_input}]
 
 def build_prompt(current_db_schema, nl_query): # Modified to accept schema directly
     """
@@ -205,8 +253,8 @@ def interactive_schema_validation(nl_query):
     Returns the final SQL generation prompt after schema confirmation.
     """
     # Step 1: Fetch schema
-    # This now calls the imported fetch_schema from db_connector.py
-    schema = fetch_schema()
+    # Served from the in-process cache; falls back to fetch_schema from db_connector.py
+    schema = _cached_schema()
 
     # Step 2: Build schema confirmation prompt
     confirmation_prompt = build_schema_confirmation_prompt(schema, nl_query)
@@ -220,6 +268,21 @@ def interactive_schema_validation(nl_query):
         "nl_query": nl_query
     }
 
+def direct_sql(nl_query):
+    """
+    Builds the SQL generation prompt straight from the cached schema, skipping
+    the confirmation prompt and correction parsing. Used when the schema is
+    auto-confirmed (testing/automation); returns the same shape as the
+    "sql_generation" step of process_schema_response.
+    """
+    schema = _cached_schema()
+    return {
+        "step": "sql_generation",
+        "prompt": build_sql_generation_prompt(nl_query, schema),
+        "schema": schema,
+        "schema_sig": schema_signature(schema)
+    }
+
 def process_schema_response(user_response, original_schema, nl_query):
     """
     Processes the user's schema confirmation response and either:
@@ -229,11 +292,13 @@ def process_schema_response(user_response, original_schema, nl_query):
     updated_schema, is_confirmed = parse_schema_corrections(user_response, original_schema)
 
     if is_confirmed:
-        # Generate SQL with confirmed schema
+        # Generate SQL with confirmed schema. The signature is computed once
+        # here so caches downstream can key on it without rehashing the schema.
         return {
             "step": "sql_generation",
             "prompt": build_sql_generation_prompt(nl_query, updated_schema),
-            "schema": updated_schema
+            "schema": updated_schema,
+            "schema_sig": schema_signature(updated_schema)
         }
     else:
         # Schema was corrected, show updated schema for final confirmation
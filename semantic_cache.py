@@ -0,0 +1,115 @@
+import os
+import pickle
+import threading
+
+# Semantic cache for generated SQL. Paraphrased questions ("top 3 customers" vs
+# "top three customers") map to nearby sentence embeddings, so a previously
+# generated answer can be served without calling the LLM again.
+#
+# sentence-transformers and faiss are heavy optional dependencies, so the cache
+# is opt-in (NL2SQL_SEMANTIC_CACHE=1) and they are only imported on first use.
+#   pip install sentence-transformers faiss-cpu
+
+SEMANTIC_CACHE_DIR = os.getenv("NL2SQL_SEMANTIC_CACHE_DIR", ".semantic_cache")
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2" # 384-dim sentence embeddings
+SIMILARITY_THRESHOLD = 0.92 # Minimum cosine similarity to count as a hit
+SEARCH_K = 5 # Neighbours checked, since the nearest one may belong to another schema
+
+
+class SemanticSQLCache:
+    def __init__(self, cache_dir: str = SEMANTIC_CACHE_DIR, threshold: float = SIMILARITY_THRESHOLD):
+        self.index_path = os.path.join(cache_dir, "index.faiss")
+        self.entries_path = os.path.join(cache_dir, "entries.pkl")
+        self.threshold = threshold
+        self._model = None
+        self._index = None
+        self._entries = [] # (nl_query, schema_signature, sql_queries), parallel to the index
+        self._lock = threading.Lock()
+        self._disabled = False
+
+    def _ensure_loaded(self) -> bool:
+        """
+        Loads the embedding model and any persisted index on first use.
+        Returns False (and disables the cache) if the optional dependencies are missing.
+        """
+        if self._disabled:
+            return False
+        if self._model is not None:
+            return True
+        try:
+            import faiss
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            print(f"⚠️ Semantic cache disabled, missing dependency: {e}")
+            self._disabled = True
+            return False
+
+        try:
+            model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+            dim = model.get_sentence_embedding_dimension()
+            if os.path.exists(self.index_path) and os.path.exists(self.entries_path):
+                index = faiss.read_index(self.index_path)
+                with open(self.entries_path, "rb") as f:
+                    entries = pickle.load(f)
+            else:
+                # Inner product on normalized embeddings is cosine similarity
+                index, entries = faiss.IndexFlatIP(dim), []
+        except Exception as e:
+            # e.g. the model download failed or the persisted index is corrupt
+            print(f"⚠️ Semantic cache disabled, could not load it: {e}")
+            self._disabled = True
+            return False
+        self._model, self._index, self._entries = model, index, entries
+        return True
+
+    def _embed(self, nl_query: str):
+        return self._model.encode([nl_query.strip()], normalize_embeddings=True).astype("float32")
+
+    def lookup(self, nl_query: str, schema_sig: str):
+        """
+        Returns the cached SQL queries for a semantically similar question asked
+        against the same schema, or None on a miss.
+        """
+        with self._lock:
+            if not self._ensure_loaded() or self._index.ntotal == 0:
+                return None
+            try:
+                scores, ids = self._index.search(self._embed(nl_query), min(SEARCH_K, self._index.ntotal))
+            except Exception as e:
+                print(f"⚠️ Semantic cache lookup failed, treating as a miss: {e}")
+                return None
+            for score, idx in zip(scores[0], ids[0]):
+                if score < self.threshold:
+                    break # Results are sorted by similarity
+                cached_query, cached_sig, sql_queries = self._entries[idx]
+                if cached_sig == schema_sig:
+                    print(f"✅ Semantic cache hit ({score:.3f}) for: '{cached_query}'")
+                    return sql_queries
+            return None
+
+    def add(self, nl_query: str, schema_sig: str, sql_queries: list):
+        """
+        Stores generated SQL for a question and persists the index to disk.
+        """
+        with self._lock:
+            if not self._ensure_loaded():
+                return
+            import faiss
+            try:
+                embedding = self._embed(nl_query)
+                self._index.add(embedding)
+            except Exception as e:
+                print(f"⚠️ Could not add to semantic cache: {e}")
+                return
+            self._entries.append((nl_query, schema_sig, sql_queries))
+            try:
+                os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+                faiss.write_index(self._index, self.index_path)
+                with open(self.entries_path, "wb") as f:
+                    pickle.dump(self._entries, f)
+            except Exception as e:
+                print(f"⚠️ Could not write semantic cache: {e}")
+
+
+# Shared instance, or None when the semantic cache is not enabled
+semantic_cache = SemanticSQLCache() if os.getenv("NL2SQL_SEMANTIC_CACHE") == "1" else None
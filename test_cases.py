@@ -1,7 +1,19 @@
-test_cases = [
-    {
-        "nl_query": "List the top 3 customers with the most recent subscription dates, showing their full name, company, and subscription date.",
-        "expected_sql": """
+import textwrap
+
+# Benchmark test cases stored column-wise (struct of arrays): entry i of each
+# list belongs to test case i, so harness code can zip() them or pass
+# nl_queries straight to a batched runner.
+
+nl_queries = [
+    "List the top 3 customers with the most recent subscription dates, showing their full name, company, and subscription date.",
+    "Find the company with the highest average length of customer email addresses. Show the company name and that average length.",
+    "For each country, rank customers by their subscription date (most recent first). Then, list the first_name, last_name, and subscription_date of the 2nd most recent subscriber in each country. If a country has fewer than 2 subscribers, do not include it. Limit the results to 5 entries.",
+    "Identify any customers who have identical full names (first_name and last_name combined) but different customer_alphanum_ids. List their full name and count how many such duplicates exist.",
+    "Find customers whose subscription date is within the last 30 days from today (assume today is '2022-05-20' for the example). List their first name, last name, and subscription date. Limit the results to 10 entries.",
+]
+
+expected_sqls = [
+    """
         SELECT
             first_name || ' ' || last_name AS full_name,
             company,
@@ -12,15 +24,7 @@ test_cases = [
             subscription_date DESC
         LIMIT 3;
         """,
-        "expected_result": [
-            ['Amanda Santos', 'Camacho-Lamb', '2022-05-29'],
-            ['Bethany Barrera', 'Swanson, Figueroa and Heath', '2022-05-29'],
-            ['Joel Shea', 'Richmond-Horne', '2022-05-29']
-        ]
-    },
-    {
-        "nl_query": "Find the company with the highest average length of customer email addresses. Show the company name and that average length.",
-        "expected_sql": """
+    """
         SELECT
             company,
             AVG(LENGTH(email)) AS avg_email_length
@@ -32,13 +36,7 @@ test_cases = [
             avg_email_length DESC
         LIMIT 1;
         """,
-        "expected_result": [
-            ['Hart Group', 37.0]
-        ]
-    },
-    {
-        "nl_query": "For each country, rank customers by their subscription date (most recent first). Then, list the first_name, last_name, and subscription_date of the 2nd most recent subscriber in each country. If a country has fewer than 2 subscribers, do not include it. Limit the results to 5 entries.",
-        "expected_sql": """
+    """
         WITH RankedCustomers AS (
             SELECT
                 first_name,
@@ -60,17 +58,7 @@ test_cases = [
             rn = 2
         LIMIT 5;
         """,
-        "expected_result": [
-            ['Francis', 'Goodman', 'Afghanistan', '2022-02-08'],
-            ['Bianca', 'Henry', 'Albania', '2020-04-13'],
-            ['Jocelyn', 'Stephens', 'Algeria', '2021-08-08'],
-            ['Kathryn', 'Hester', 'American Samoa', '2022-01-22'],
-            ['Miranda', 'Robles', 'Andorra', '2020-10-16']
-        ]
-    },
-    {
-        "nl_query": "Identify any customers who have identical full names (first_name and last_name combined) but different customer_alphanum_ids. List their full name and count how many such duplicates exist.",
-        "expected_sql": """
+    """
         WITH FullNames AS (
             SELECT
                 first_name || ' ' || last_name AS full_name,
@@ -88,11 +76,7 @@ test_cases = [
         FROM
             FullNames;
         """,
-        "expected_result": [] # Confirmed: No results
-    },
-    {
-        "nl_query": "Find customers whose subscription date is within the last 30 days from today (assume today is '2022-05-20' for the example). List their first name, last name, and subscription date. Limit the results to 10 entries.",
-        "expected_sql": """
+    """
         SELECT
             first_name,
             last_name,
@@ -106,17 +90,38 @@ test_cases = [
             subscription_date DESC
         LIMIT 10;
         """,
-        "expected_result": [
-            ['Madison', 'Clark', '2022-05-19'],
-            ['Angel', 'Conner', '2022-05-19'],
-            ['Marcia', 'Horton', '2022-05-17'],
-            ['Brady', 'Mcdaniel', '2022-05-17'],
-            ['Jodi', 'Moran', '2022-05-17'],
-            ['Latoya', 'Clements', '2022-05-16'],
-            ['Jeremiah', 'Guerrero', '2022-05-11'],
-            ['Reginald', 'Blankenship', '2022-05-10'],
-            ['Logan', 'Riddle', '2022-05-08'],
-            ['Riley', 'Aguirre', '2022-05-07']
-        ]
-    }
-]
\ No newline at end of file
+]
+
+expected_results = [
+    [
+        ['Amanda Santos', 'Camacho-Lamb', '2022-05-29'],
+        ['Bethany Barrera', 'Swanson, Figueroa and Heath', '2022-05-29'],
+        ['Joel Shea', 'Richmond-Horne', '2022-05-29']
+    ],
+    [
+        ['Hart Group', 37.0]
+    ],
+    [
+        ['Francis', 'Goodman', 'Afghanistan', '2022-02-08'],
+        ['Bianca', 'Henry', 'Albania', '2020-04-13'],
+        ['Jocelyn', 'Stephens', 'Algeria', '2021-08-08'],
+        ['Kathryn', 'Hester', 'American Samoa', '2022-01-22'],
+        ['Miranda', 'Robles', 'Andorra', '2020-10-16']
+    ],
+    [], # Confirmed: No results
+    [
+        ['Madison', 'Clark', '2022-05-19'],
+        ['Angel', 'Conner', '2022-05-19'],
+        ['Marcia', 'Horton', '2022-05-17'],
+        ['Brady', 'Mcdaniel', '2022-05-17'],
+        ['Jodi', 'Moran', '2022-05-17'],
+        ['Latoya', 'Clements', '2022-05-16'],
+        ['Jeremiah', 'Guerrero', '2022-05-11'],
+        ['Reginald', 'Blankenship', '2022-05-10'],
+        ['Logan', 'Riddle', '2022-05-08'],
+        ['Riley', 'Aguirre', '2022-05-07']
+    ],
+]
+
+# Dedent and strip the expected SQL once at import instead of on every comparison
+expected_sqls = [textwrap.dedent(sql).strip() for sql in expected_sqls]